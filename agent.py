@@ -1,23 +1,34 @@
 from agents import Agent
+
+# Shared by the specialist agents: the orchestrator may call the tool itself and send the result
+# as a JSON user message, in which case the agent only needs to summarize it.
+_SUMMARY_INSTRUCTIONS = (
+    " If the user message is a JSON object with 'query' and 'data' keys, the data has already been retrieved: "
+    "do not call the tool again, just summarize the data concisely as an answer to the query."
+)
 from .tools.weather import fetch_weather_tool # Import the FunctionTool object
 
 # Define the specialized Weather Agent
 weather_agent = Agent(
     name="Weather Agent",
     handoff_description="Specialist agent for weather-related questions (current conditions, forecasts).",
-    instructions="You are a helpful assistant that provides real-time weather updates based on user queries. Use the available tool to fetch the data.",
+    instructions="You are a helpful assistant that provides real-time weather updates based on user queries. Use the available tool to fetch the data." + _SUMMARY_INSTRUCTIONS,
     tools=[fetch_weather_tool], # Use the FunctionTool object
 )
 
 # We will define other agents (Stock, Triage, Orchestrator) in separate files or below.
-from .tools.stock import fetch_stock_price_tool # Import the FunctionTool object
+from .tools.stock import fetch_stock_price_tool, fetch_stock_prices_batch_tool # Import the FunctionTool objects
 
 # Define the specialized Stock Agent
 stock_agent = Agent(
     name="Stock Agent",
     handoff_description="Specialist agent for fetching current stock prices.",
-    instructions="You are an assistant that provides the latest stock price for a given ticker symbol using the available tool.",
-    tools=[fetch_stock_price_tool], # Use the FunctionTool object
+    instructions=(
+        "You are an assistant that provides the latest stock price for a given ticker symbol using the available tools. "
+        "When the user asks about several symbols, fetch them with a single batch tool call."
+        + _SUMMARY_INSTRUCTIONS
+    ),
+    tools=[fetch_stock_price_tool, fetch_stock_prices_batch_tool], # Use the FunctionTool objects
 )
 from .tools.historical_stock import fetch_historical_stock_tool # Import the new tool object
 
@@ -30,6 +41,7 @@ historical_stock_agent = Agent(
         "for a specific ticker symbol between a start and end date. Use the available tool to fetch the data. "
         "When presenting the data, mention the symbol and the date range clearly. If there are many data points, "
         "summarize key trends or provide the first few and last few data points, rather than listing everything."
+        + _SUMMARY_INSTRUCTIONS
     ),
     tools=[fetch_historical_stock_tool],
 )
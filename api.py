@@ -1,17 +1,31 @@
 import os
 import asyncio
-from fastapi import FastAPI, HTTPException, Request
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-from typing import List, Dict, Optional, Any # Add Any for structured_data
+from typing import List, Dict, Optional, Any, Deque, Iterable, Tuple # Add Any for structured_data
 
 # Load environment variables from .env file at the project root
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+# LOG_LEVEL (e.g. DEBUG for per-request details) applies to this app's own loggers only. Third-party
+# loggers stay at INFO, and urllib3 at WARNING: its DEBUG lines include full request URLs, which
+# carry the API keys as query parameters (keys in its retry warnings are masked by tools/_http.py).
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger(__package__ or __name__).setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logging.getLogger("urllib3").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
 # Import the orchestration runner function AFTER loading .env
 from .orchestrator import run_orchestration
+from .tools._http import prewarm_connections
 
 # --- Pydantic Models for Request/Response ---
 class ChatMessage(BaseModel):
@@ -30,8 +44,19 @@ class ChatResponse(BaseModel):
     # Optionally return history:
     # history: List[ChatMessage] = Field(default_factory=list)
 
+class _ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (the app's default response class)."""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
 # --- FastAPI App Setup ---
-app = FastAPI(title="Multi-Agent API")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Open connections to the stock and weather APIs in the background so the first query doesn't pay for DNS + TLS
+    prewarm_connections()
+    yield
+
+app = FastAPI(title="Multi-Agent API", default_response_class=_ORJSONResponse, lifespan=_lifespan)
 
 # --- CORS Middleware Configuration (Simplified for Debugging) ---
 # Allow all origins, methods, and headers.
@@ -45,12 +70,130 @@ app.add_middleware(
 )
 
 # --- In-memory History Store ---
-# Maps conversation ID to a list of message dictionaries
-conversation_histories: Dict[str, List[Dict[str, str]]] = {}
+class _HistoryStore:
+    """
+    Bounded LRU map of conversation ID -> deque of message dictionaries.
+    Keeps at most `max_convs` conversations (least recently used are evicted first)
+    and at most the last `max_msgs` messages of each conversation (via the deque's maxlen).
+    """
+    def __init__(self, max_convs: int = 10_000, max_msgs: int = 64):
+        self.max_convs = max_convs
+        self.max_msgs = max_msgs
+        self._histories: "OrderedDict[str, Deque[Dict[str, str]]]" = OrderedDict()
+
+    def new_history(self, messages: Iterable[Dict[str, str]] = ()) -> Deque[Dict[str, str]]:
+        return deque(messages, maxlen=self.max_msgs)
+
+    def get(self, conversation_id: str) -> Deque[Dict[str, str]]:
+        """
+        Returns a copy of the stored history (or a new empty one). The caller appends to its copy and
+        writes it back with put(), so a failed or still-running turn never shows up in the store.
+        """
+        history = self._histories.get(conversation_id)
+        if history is None:
+            return self.new_history()
+        self._histories.move_to_end(conversation_id)
+        return self.new_history(history)
+
+    def put(self, conversation_id: str, history: Deque[Dict[str, str]]) -> None:
+        self._histories[conversation_id] = history
+        self._histories.move_to_end(conversation_id)
+        while len(self._histories) > self.max_convs:
+            self._histories.popitem(last=False)
+
+conversation_histories = _HistoryStore()
+
+async def _persist_history(conversation_id: str, history: Deque[Dict[str, str]]) -> None:
+    # Runs as a background task after the response is sent. Async so it runs on the event loop
+    # rather than a worker thread, keeping the store single-threaded.
+    conversation_histories.put(conversation_id, history)
+    logger.debug("Stored updated history length: %d", len(history))
+
+# --- Historical Payload Shaping ---
+# Columns of a historical bar; "date" is always returned
+_BAR_FIELDS = ("date", "open", "high", "low", "close", "volume")
+# Ranges longer than about a year of trading days (without an explicit ?limit=) are returned as summary + sample
+_MAX_INLINE_BARS = 252
+_SAMPLE_BARS = 5
+# Full historical payload of the latest long-range answer per conversation, for /chat/{id}/history/full.
+# Bounded by total bar count (a multi-year payload is several MB) as well as by conversation count.
+_MAX_FULL_PAYLOADS = 50
+_MAX_STORED_BARS = 50_000
+full_historical_payloads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_stored_bars = 0
+
+def _remember_full_payload(conversation_id: str, payload: Dict[str, Any]) -> None:
+    global _stored_bars
+    previous = full_historical_payloads.pop(conversation_id, None)
+    if previous is not None:
+        _stored_bars -= len(previous["historical"])
+    full_historical_payloads[conversation_id] = payload
+    _stored_bars += len(payload["historical"])
+    # Evict least recently stored payloads, but always keep the one just added
+    while len(full_historical_payloads) > 1 and (
+        len(full_historical_payloads) > _MAX_FULL_PAYLOADS or _stored_bars > _MAX_STORED_BARS
+    ):
+        _, evicted = full_historical_payloads.popitem(last=False)
+        _stored_bars -= len(evicted["historical"])
+
+def _summarize_bars(bars: List[Dict[str, Any]]) -> Dict[str, Any]:
+    first_close, last_close = bars[0].get("close"), bars[-1].get("close")
+    highs = [bar["high"] for bar in bars if bar.get("high") is not None]
+    lows = [bar["low"] for bar in bars if bar.get("low") is not None]
+    return {
+        "start_date": bars[0].get("date"),
+        "end_date": bars[-1].get("date"),
+        "points": len(bars),
+        "first_close": first_close,
+        "last_close": last_close,
+        "change_pct": round((last_close - first_close) / first_close * 100, 2) if first_close and last_close is not None else None,
+        "high": max(highs, default=None),
+        "low": min(lows, default=None),
+    }
+
+def _project_bars(bars: List[Dict[str, Any]], selected: Optional[Tuple[str, ...]]) -> List[Dict[str, Any]]:
+    if selected is None:
+        return bars
+    return [{f: bar.get(f) for f in selected} for bar in bars]
+
+def _shape_structured_data(conversation_id: str, structured_data: Any, limit: Optional[int], fields: Optional[str]) -> Any:
+    """
+    Applies ?limit= (most recent N bars) and ?fields= (bar columns) to historical stock data.
+    Long ranges without a limit are replaced by a summary and a first/last sample; the full
+    payload stays available from /chat/{conversation_id}/history/full.
+    Never mutates structured_data, which may be shared with the tool's response cache.
+    """
+    if not isinstance(structured_data, dict) or not isinstance(structured_data.get("historical"), list):
+        return structured_data
+    bars = structured_data["historical"]
+
+    if limit is not None:
+        bars = bars[-limit:]
+
+    # ?fields= only projects the returned rows; the summary always sees every column
+    selected = None
+    if fields:
+        requested = {name.strip() for name in fields.split(",")}
+        selected = ("date",) + tuple(name for name in _BAR_FIELDS[1:] if name in requested)
+
+    if limit is None and len(bars) > _MAX_INLINE_BARS:
+        _remember_full_payload(conversation_id, structured_data)
+        return {
+            "symbol": structured_data.get("symbol"),
+            "summary": _summarize_bars(bars),
+            "sample": _project_bars(bars[:_SAMPLE_BARS] + bars[-_SAMPLE_BARS:], selected),
+            "truncated": True,
+        }
+    return {**structured_data, "historical": _project_bars(bars, selected)}
 
 # --- API Endpoint ---
 @app.post("/chat", response_model=ChatResponse)
-async def handle_chat(request_data: ChatRequest):
+async def handle_chat(
+    request_data: ChatRequest,
+    background_tasks: BackgroundTasks,
+    limit: Optional[int] = Query(None, ge=1, description="Return only the most recent N historical bars."),
+    fields: Optional[str] = Query(None, description="Comma-separated historical bar columns to return (date is always included)."),
+):
     """
     API endpoint to interact with the orchestrated agent system using FastAPI.
     """
@@ -58,57 +201,63 @@ async def handle_chat(request_data: ChatRequest):
     conversation_id = request_data.conversation_id
     history_override = request_data.history
 
-    print(f"\n--- New FastAPI Request ---")
-    print(f"Conversation ID: {conversation_id}")
-    print(f"Received API query: '{query}'")
+    logger.info("New chat request: conversation_id=%s", conversation_id)
+    logger.debug("Received API query: %r", query)
 
     # Retrieve or initialize history
-    history_messages = conversation_histories.get(conversation_id, [])
+    history = conversation_histories.get(conversation_id)
 
     # Handle optional history override
     if history_override is not None:
         # Convert Pydantic models back to dicts for the orchestrator function
-        history_messages = [msg.model_dump() for msg in history_override]
-        print("Using history override from request.")
+        history = conversation_histories.new_history(msg.model_dump() for msg in history_override)
+        logger.debug("Using history override from request.")
     else:
-        print(f"Retrieved history length: {len(history_messages)}")
+        logger.debug("Retrieved history length: %d", len(history))
 
-    # Add user query to history (as dict) before calling orchestrator
-    current_turn_history = history_messages + [{"role": "user", "content": query}]
+    # Add user query to history (as dict) before calling orchestrator. This is this request's own
+    # copy; the deque's maxlen drops the oldest messages, so the prompt doesn't grow with session age.
+    history.append({"role": "user", "content": query})
 
     try:
-        # Run the orchestration logic (expects list of dicts)
+        # Run the orchestration logic (history already ends with the user query)
         # Run orchestration, now returns a tuple (nl_response, structured_data)
-        nl_response, structured_data = await run_orchestration(query, current_turn_history)
+        nl_response, structured_data = await run_orchestration(query, history)
 
         # Add assistant response (NL part) to history
-        assistant_message = {"role": "assistant", "content": nl_response}
-        updated_history = current_turn_history + [assistant_message]
-
-        # Store updated history
-        conversation_histories[conversation_id] = updated_history
-        print(f"Stored updated history length: {len(updated_history)}")
-
-        print(f"Agent NL response for API: {nl_response}")
-        if structured_data:
-            print(f"Agent structured data for API: {structured_data}")
-
-        # Return Pydantic model response, including structured_data if present
-        return ChatResponse(
-            response=nl_response,
-            conversation_id=conversation_id,
-            structured_data=structured_data
-            # Optionally include history:
-            # history=[ChatMessage(**msg) for msg in updated_history]
-        )
+        history.append({"role": "assistant", "content": nl_response})
+
+        # Store updated history once the response has been sent
+        background_tasks.add_task(_persist_history, conversation_id, history)
+
+        logger.debug("Agent NL response for API: %s", nl_response)
+        logger.debug("Agent structured data for API: %s", structured_data)
+
+        # Return the ChatResponse shape directly through orjson: validating and serializing a large
+        # historical list through the Pydantic model dominates response time
+        return _ORJSONResponse({
+            "response": nl_response,
+            "conversation_id": conversation_id,
+            "structured_data": _shape_structured_data(conversation_id, structured_data, limit, fields),
+        })
 
     except Exception as e:
-        print(f"Error processing API request: {e}")
-        import traceback
-        traceback.print_exc()
+        # The stored history is left untouched: nothing is persisted for a failed turn
+        logger.exception("Error processing API request: %s", e)
         # Use FastAPI's HTTPException for standard error responses
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+@app.get("/chat/{conversation_id}/history/full")
+async def get_full_historical_data(conversation_id: str):
+    """
+    Returns the full historical stock payload behind the latest summarized (long-range) answer
+    of a conversation.
+    """
+    payload = full_historical_payloads.get(conversation_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="No historical data stored for this conversation.")
+    return _ORJSONResponse(payload)
+
 # --- How to Run ---
 # Use Uvicorn to run the FastAPI application:
 # Ensure virtual environment is active (`source env/bin/activate`)
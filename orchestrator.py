@@ -1,11 +1,81 @@
 import re # Import regex for parameter extraction
-from agents import Agent, Runner
+import string
+import json
+import dataclasses
+import asyncio
+import functools
+import importlib
+import logging
+from agents import Agent
 from datetime import date, timedelta # Import date utilities
-from .agent import triage_agent, weather_agent, stock_agent, historical_stock_agent # Import ALL specialist agents
-from .tools.weather import fetch_weather, WeatherInput
-from .tools.stock import fetch_stock_price, StockInput
-from .tools.historical_stock import fetch_historical_stock, HistoricalStockInput # Import historical tool
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Iterable, Sequence, Callable
+
+try:
+    # Optional: google-re2 compiles the intent alternation to a linear-time DFA
+    import re2 as _intent_re_engine
+except ImportError:
+    _intent_re_engine = re
+
+logger = logging.getLogger(__name__)
+
+# --- Lazy Imports ---
+# The tool modules (and the specialist agents wrapping them) pull in HTTP clients and caches,
+# so they're imported on first use rather than at worker startup.
+_TOOL_FUNCTIONS = {
+    "weather": (".tools.weather", "fetch_weather"),
+    "stock": (".tools.stock", "fetch_stock_price"),
+    "historical_stock": (".tools.historical_stock", "fetch_historical_stock"),
+}
+_SUMMARIZER_AGENTS = {"weather": "weather_agent", "stock": "stock_agent", "historical_stock": "historical_stock_agent"}
+# How each tool's result is referred to in user-facing messages
+_TOOL_LABELS = {"weather": "weather data", "stock": "stock price", "historical_stock": "historical stock data"}
+
+@functools.cache
+def _tool_function(tool_name: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    module_name, function_name = _TOOL_FUNCTIONS[tool_name]
+    return getattr(importlib.import_module(module_name, __package__), function_name)
+
+@functools.cache
+def _summarizer_agent(tool_name: str) -> Agent:
+    return getattr(importlib.import_module(".agent", __package__), _SUMMARIZER_AGENTS[tool_name])
+
+@functools.cache
+def _runner():
+    from agents import Runner
+    return Runner
+
+# --- Intent Heuristic ---
+# Keywords for different task types
+_WEATHER_KW = frozenset({"weather", "temperature", "forecast", "conditions"})
+_CURRENT_STOCK_KW = frozenset({"stock", "price", "quote", "ticker", "symbol"}) # Focus on current price
+_HISTORICAL_STOCK_KW = frozenset({"historical", "history", "past", "performance", "last month", "last year", "between", "from", "since"})
+# Crude company name -> ticker mapping
+_SYMBOL_MAP = {"ford": "F", "microsoft": "MSFT", "tesla": "TSLA", "apple": "AAPL", "google": "GOOGL", "nvidia": "NVDA"}
+_KNOWN_TICKERS = ("AAPL", "GOOG", "MSFT", "TSLA", "F", "NVDA") # Add more as needed
+# Any lowercase token (company name or ticker) -> canonical symbol, for O(1) lookups per token
+_SYMBOL_INDEX = {**{ticker.lower(): ticker for ticker in _KNOWN_TICKERS}, **_SYMBOL_MAP}
+
+# The patterns below run on the lowercased query, so they don't need re.IGNORECASE
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# "weather in Paris", "temperature in Paris", "forecast for Paris", "weather like in Paris", ...
+_WEATHER_LOC_RE = re.compile(r"(?:weather|temperature|forecast|conditions)(?:\s+like)?\s+(?:in|for|at)\s+([\w\s]+)")
+
+def _alternation(words: Iterable[str]) -> str:
+    # Longest first so a keyword never shadows a longer one sharing its prefix. Whole words only
+    # (an optional plural "s" allowed), so "pasta" doesn't match "past" nor "symbolic" "symbol".
+    return r"\b(?:" + "|".join(re.escape(word) for word in sorted(words, key=lambda w: (-len(w), w))) + r")s?\b"
+
+# Single scanner for every intent signal. Branch order matters: dates come before the
+# keywords so "past 3 days" is reported as a relative date rather than the "past" keyword.
+INTENT_RE = _intent_re_engine.compile(
+    "|".join([
+        r"(?P<isodate>\b\d{4}-\d{2}-\d{2}\b)",
+        r"(?P<reldate>\b(?:last|past)\s+(?P<rel_num>\d+)\s+(?P<rel_unit>day|week|month)s?\b)",
+        f"(?P<weather>{_alternation(_WEATHER_KW)})",
+        f"(?P<histstock>{_alternation(_HISTORICAL_STOCK_KW)})",
+        f"(?P<stock>{_alternation(_CURRENT_STOCK_KW)})",
+    ])
+)
 
 # Define the Orchestration Agent
 # This agent is conversational and manages the interaction flow.
@@ -27,69 +97,167 @@ orchestrator_agent = Agent(
     # We'll handle the logic of calling the Triage Agent in the main run function.
 )
 
+# --- Parameter Extraction ---
+# These helpers work off the tokens and INTENT_RE matches already computed for the query.
+
+def _uppercase_words(tokens: List[str]) -> List[str]:
+    """All-caps words of up to 5 letters (surrounding punctuation removed), in query order."""
+    words = (token.strip(string.punctuation) for token in tokens)
+    return [word for word in words if len(word) <= 5 and word.isalpha() and word.isupper()]
+
+def extract_symbol(tokens: List[str], lower_tokens: List[str]) -> Optional[str]:
+    # Prefer a known company name or ticker, then an all-caps word that looks like a ticker
+    for token in lower_tokens:
+        if token in _SYMBOL_INDEX:
+            return _SYMBOL_INDEX[token]
+    candidates = _uppercase_words(tokens)
+    for word in candidates:
+        if len(word) >= 3:
+            return word
+    # Fall back to shorter uppercase words
+    return candidates[0] if candidates else None
+
+def extract_dates(matches: List[re.Match]) -> Tuple[Optional[str], Optional[str]]:
+    today = date.today()
+
+    # 1. Look for YYYY-MM-DD format (most specific)
+    dates_iso = [m.group() for m in matches if m.lastgroup == "isodate"]
+    if len(dates_iso) >= 2:
+        # Sort to ensure start is before end
+        dates_iso.sort()
+        return dates_iso[0], dates_iso[1]
+    elif len(dates_iso) == 1:
+         # If only one specific date, maybe user wants data *since* that date?
+         # Or just that single day? API needs a range. Let's default to range from that day to today.
+         # Could ask for clarification, but let's try this default.
+         return dates_iso[0], today.isoformat()
+
+    # 2. Look for relative ranges like "last X days/weeks/months"
+    relative_match = next((m for m in matches if m.lastgroup == "reldate"), None)
+    if relative_match:
+        num = int(relative_match.group("rel_num"))
+        unit = relative_match.group("rel_unit")
+        end_date = today
+        if unit == 'day':
+            start_date = end_date - timedelta(days=num)
+        elif unit == 'week':
+            start_date = end_date - timedelta(weeks=num)
+        elif unit == 'month':
+            # Approximate month by multiplying days (crude but simple)
+            start_date = end_date - timedelta(days=num * 30)
+        else: # Should not happen based on regex
+            return None, None
+        # Ensure start_date is not after end_date (can happen with num=0)
+        if start_date >= end_date:
+            start_date = end_date - timedelta(days=1) # Default to 1 day if range is invalid
+        return start_date.isoformat(), end_date.isoformat()
+
+    # 3. Look for keywords like "last month", "last year"
+    keywords_found = {m.group() for m in matches if m.lastgroup == "histstock"}
+    if "last month" in keywords_found:
+        first_day_this_month = today.replace(day=1)
+        last_day_last_month = first_day_this_month - timedelta(days=1)
+        first_day_last_month = last_day_last_month.replace(day=1)
+        return first_day_last_month.isoformat(), last_day_last_month.isoformat()
+    if "last year" in keywords_found:
+        first_day_last_year = date(today.year - 1, 1, 1)
+        last_day_last_year = date(today.year - 1, 12, 31)
+        return first_day_last_year.isoformat(), last_day_last_year.isoformat()
+
+    # Add more specific keywords if needed, e.g., "this week", "year to date"
+
+    # 4. If no dates found, return None
+    return None, None
+
+# --- Chit-chat Fast Path ---
+# Canned replies for obvious greetings/thanks/goodbyes so they don't need an LLM round trip.
+_CHITCHAT_REPLIES = {
+    "greeting": "Hello! I can help with current weather, current stock prices and historical stock data. What would you like to know?",
+    "thanks": "You're welcome! Let me know if there's anything else I can help with.",
+    "bye": "Goodbye! Come back anytime you need weather or stock updates.",
+}
+# Whole-message match only (at most two trailing words), anything longer goes to the orchestrator
+_CHITCHAT_RE = re.compile(
+    r"^\s*(?:(?P<greeting>hi|hello|hey|good (?:morning|afternoon|evening))|(?P<thanks>thanks|thank you|thx)|(?P<bye>bye|goodbye|see you))"
+    r"(?:[\s,]+\w+){0,2}[\s!.,]*$"
+)
+
+def _is_trivial_chitchat(lower_query: str) -> Optional[str]:
+    """
+    Returns a canned reply for trivial conversational queries (given already lower-cased), or None
+    if the orchestrator should answer.
+    """
+    match = _CHITCHAT_RE.match(lower_query)
+    if match:
+        return _CHITCHAT_REPLIES[match.lastgroup]
+    return None
+
+
+# --- Templated Results ---
+def _is_error(result: Any) -> bool:
+    # Tools report failures as {"error": ...}; successful results may be dicts or dataclasses
+    return isinstance(result, dict) and "error" in result
+
+def _format_small_result(tool_name: str, data: Any) -> Optional[str]:
+    """
+    Returns a templated answer for small, fixed-shape tool results (StockQuote, WeatherResult),
+    or None when the summarizer agent should write the response (e.g. historical data).
+    """
+    if tool_name == "stock":
+        if data.latest_price is None:
+            return None
+        response = f"{data.symbol} is currently trading at ${data.latest_price:.2f}."
+        if data.low is not None and data.high is not None:
+            response += f" Today's range is ${data.low:.2f} - ${data.high:.2f}."
+        return response
+    if tool_name == "weather":
+        if data.temperature is None or not data.weather or not data.location:
+            return None
+        response = f"It's {data.temperature:.1f}°C and {data.weather} in {data.location}." # Orchestrator requests metric units
+        if data.feels_like is not None:
+            response += f" It feels like {data.feels_like:.1f}°C."
+        return response
+    return None
+
 # We need a function that handles the orchestration logic, including history.
 # This function will use the orchestrator_agent to decide the next step
 # and potentially call the triage_agent.
 
-async def run_orchestration(query: str, history: List[Dict[str, str]]) -> Tuple[str, Optional[Any]]:
+async def run_orchestration(query: str, history: Sequence[Dict[str, str]]) -> Tuple[str, Optional[Any]]:
     """
     Manages the conversation using the orchestrator and triage agents.
-    - Uses orchestrator_agent to interpret the query in context of history (list of dicts).
+    - Uses orchestrator_agent to interpret the query in context of history (sequence of message dicts
+      that already ends with the current user query).
     - Decides whether to call triage_agent or respond directly.
     - Returns a tuple: (natural_language_response: str, structured_data: Optional[Any])
     """
-    print(f"--- Running Orchestration ---")
-    print(f"History: {history}") # Log history (already list of dicts)
-    print(f"Current Query: {query}")
-
-    # Combine history and current query for the orchestrator
-    messages_for_orchestrator = history + [{"role": "user", "content": query}]
-
-    # Run the orchestrator to decide the plan (or respond directly)
-    # Runner.run likely accepts List[Dict[str, str]] for the messages argument
-    # We expect its output to guide whether we call triage or not.
-    # For simplicity here, we'll assume the orchestrator's primary role
-    # is to decide IF delegation is needed. A more complex setup might
-    # have the orchestrator *generate* the query for the triage agent.
-    # Let's simplify: if the query looks like a task, we run triage.
-    # A more robust approach would involve analyzing orchestrator_result.
+    logger.debug("Running orchestration. History: %s", history) # Only formatted when DEBUG is enabled
+    logger.debug("Current Query: %r", query)
 
     # Improved heuristic: Check for keywords OR potential company names/symbols
     # TODO: A more robust approach would involve analyzing the orchestrator_agent's
     #       output to determine intent, but this heuristic is a step up.
-    # Keywords for different task types
-    weather_keywords = ["weather", "temperature", "forecast", "conditions"]
-    current_stock_keywords = ["stock", "price", "quote", "ticker", "symbol"] # Focus on current price
-    historical_stock_keywords = ["historical", "history", "past", "performance", "last month", "last year", "between", "from", "since"]
-    # Combine general stock terms that might apply to either current or historical
-    general_stock_keywords = ["stock", "ticker", "symbol"]
-    potential_symbols_or_names = ["ford", "microsoft", "tesla", "apple", "google", "nvidia", "aapl", "goog", "msft", "tsla", "f", "nvda"] # Add more as needed
-
+    # One pass over the query collects every signal; the matches are reused for parameter extraction.
+    # Case-fold and tokenize once; everything below reuses these.
     lower_query = query.lower()
+    tokens = query.split()
+    lower_tokens = _TOKEN_RE.findall(lower_query)
+    intent_matches = list(INTENT_RE.finditer(lower_query))
+    groups_found = {m.lastgroup for m in intent_matches}
+    mentions_known_symbol = not _SYMBOL_INDEX.keys().isdisjoint(lower_tokens)
+    mentions_ticker = any(len(word) >= 3 for word in _uppercase_words(tokens))
 
     # --- Heuristic Refinement ---
-    is_weather_query = any(keyword in lower_query for keyword in weather_keywords)
-    # Add check for relative date patterns like "last X days/weeks/months"
-    relative_date_pattern = r'\b(last|past)\s+(\d+)\s+(day|week|month)s?\b'
-    has_relative_date = re.search(relative_date_pattern, query, re.IGNORECASE)
-    is_historical_query = any(keyword in lower_query for keyword in historical_stock_keywords) or \
-                          re.search(r'\b\d{4}-\d{2}-\d{2}\b', query) or \
-                          has_relative_date # Add relative date check
+    is_weather_query = "weather" in groups_found
+    is_historical_query = bool(groups_found & {"histstock", "isodate", "reldate"})
 
     # Check for current stock only if not clearly historical
-    is_current_stock_query = not is_historical_query and (
-        any(keyword in lower_query for keyword in current_stock_keywords) or
-        any(entity in lower_query for entity in potential_symbols_or_names) or
-        any(word.isupper() and 3 <= len(word) <= 5 for word in query.split())
-    )
-    # If general stock terms are present but neither current nor historical flags are strong, lean towards current
-    if not is_historical_query and not is_current_stock_query and any(keyword in lower_query for keyword in general_stock_keywords):
-         is_current_stock_query = True
+    is_current_stock_query = not is_historical_query and (mentions_known_symbol or mentions_ticker or "stock" in groups_found)
 
     is_task_query = is_weather_query or is_current_stock_query or is_historical_query
 
     if is_task_query:
-        print("Orchestrator identified a potential task query.")
+        logger.debug("Orchestrator identified a potential task query.")
         nl_response = "I encountered an issue processing that request." # Default response
         structured_data = None
         tool_to_use = None
@@ -97,197 +265,125 @@ async def run_orchestration(query: str, history: List[Dict[str, str]]) -> Tuple[
 
         # --- Determine Tool and Extract Parameters (Enhanced) ---
 
-        def extract_symbol(text):
-            # Try uppercase first
-            match = re.search(r"\b([A-Z]{1,5})\b", text)
-            if match: return match.group(1).upper()
-            # Try known names (crude mapping)
-            lower_text = text.lower()
-            symbol_map = {"ford": "F", "microsoft": "MSFT", "tesla": "TSLA", "apple": "AAPL", "google": "GOOGL", "nvidia": "NVDA"}
-            for name, sym in symbol_map.items():
-                if name in lower_text:
-                    return sym
-            return None
-
-        def extract_dates(text):
-            today = date.today()
-            lower_text = text.lower()
-
-            # 1. Look for YYYY-MM-DD format (most specific)
-            dates_iso = re.findall(r'\b(\d{4}-\d{2}-\d{2})\b', text)
-            if len(dates_iso) >= 2:
-                # Sort to ensure start is before end
-                dates_iso.sort()
-                return dates_iso[0], dates_iso[1]
-            elif len(dates_iso) == 1:
-                 # If only one specific date, maybe user wants data *since* that date?
-                 # Or just that single day? API needs a range. Let's default to range from that day to today.
-                 # Could ask for clarification, but let's try this default.
-                 return dates_iso[0], today.isoformat()
-
-            # 2. Look for relative ranges like "last X days/weeks/months"
-            relative_match = re.search(relative_date_pattern, text, re.IGNORECASE)
-            if relative_match:
-                _, num_str, unit = relative_match.groups()
-                num = int(num_str)
-                end_date = today
-                if unit == 'day':
-                    start_date = end_date - timedelta(days=num)
-                elif unit == 'week':
-                    start_date = end_date - timedelta(weeks=num)
-                elif unit == 'month':
-                    # Approximate month by multiplying days (crude but simple)
-                    start_date = end_date - timedelta(days=num * 30)
-                else: # Should not happen based on regex
-                    return None, None
-                # Ensure start_date is not after end_date (can happen with num=0)
-                if start_date >= end_date:
-                    start_date = end_date - timedelta(days=1) # Default to 1 day if range is invalid
-                return start_date.isoformat(), end_date.isoformat()
-
-
-            # 3. Look for keywords like "last month", "last year"
-            if "last month" in lower_text:
-                first_day_this_month = today.replace(day=1)
-                last_day_last_month = first_day_this_month - timedelta(days=1)
-                first_day_last_month = last_day_last_month.replace(day=1)
-                return first_day_last_month.isoformat(), last_day_last_month.isoformat()
-            if "last year" in lower_text:
-                first_day_last_year = date(today.year - 1, 1, 1)
-                last_day_last_year = date(today.year - 1, 12, 31)
-                return first_day_last_year.isoformat(), last_day_last_year.isoformat()
-
-            # Add more specific keywords if needed, e.g., "this week", "year to date"
-
-            # 4. If no dates found, return None
-            return None, None
-
-
         # Prioritize based on flags
         if is_weather_query:
-            weather_match = re.search(r"(?:weather in|forecast for|conditions in)\s+([\w\s]+)", query, re.IGNORECASE)
+            weather_match = _WEATHER_LOC_RE.search(lower_query)
             if weather_match:
                 tool_to_use = "weather"
-                location = weather_match.group(1).strip()
-                tool_input = WeatherInput(location=location, unit="metric")
-                print(f"Determined tool: weather, location: {location}")
+                # Keep the user's casing when lowercasing didn't shift offsets (always true for ASCII)
+                location_span = query[weather_match.start(1):weather_match.end(1)] if len(query) == len(lower_query) else weather_match.group(1)
+                location = location_span.strip()
+                tool_input = {"location": location, "unit": "metric"} # WeatherInput
+                logger.debug("Determined tool: weather, location: %s", location)
             else:
                  nl_response = "Which location's weather are you interested in?"
 
         elif is_historical_query:
-            symbol = extract_symbol(query)
-            start_date, end_date = extract_dates(query)
+            symbol = extract_symbol(tokens, lower_tokens)
+            start_date, end_date = extract_dates(intent_matches)
             if symbol and start_date: # Require symbol and at least start date
                 tool_to_use = "historical_stock"
                 # End date defaults to today in the tool if None
-                tool_input = HistoricalStockInput(symbol=symbol, start_date=start_date, end_date=end_date)
-                print(f"Determined tool: historical_stock, symbol: {symbol}, start: {start_date}, end: {end_date or 'today'}")
+                tool_input = {"symbol": symbol, "start_date": start_date, "end_date": end_date} # HistoricalStockInput
+                logger.debug("Determined tool: historical_stock, symbol: %s, start: %s, end: %s", symbol, start_date, end_date or "today")
             elif not symbol:
                  nl_response = "Which stock symbol's historical data do you want?"
             else: # Symbol found, but no date
                  nl_response = f"For which date range do you want historical data for {symbol}?"
 
         elif is_current_stock_query:
-            symbol = extract_symbol(query)
+            symbol = extract_symbol(tokens, lower_tokens)
             if symbol:
                 tool_to_use = "stock"
-                tool_input = StockInput(symbol=symbol)
-                print(f"Determined tool: stock, symbol: {symbol}")
+                tool_input = {"symbol": symbol} # StockInput
+                logger.debug("Determined tool: stock, symbol: %s", symbol)
             else:
                 nl_response = "Which stock symbol are you interested in?"
 
         # --- Execute Tool Directly ---
         if tool_to_use and tool_input:
-            print(f"Calling tool '{tool_to_use}' directly with input: {tool_input}")
+            logger.info("Calling tool %r directly with input: %s", tool_to_use, tool_input)
             try:
-                # Call the imported raw function directly
-                if tool_to_use == "weather":
-                    structured_data = fetch_weather(tool_input)
-                elif tool_to_use == "stock":
-                    structured_data = fetch_stock_price(tool_input)
-                elif tool_to_use == "historical_stock":
-                     structured_data = fetch_historical_stock(tool_input)
+                # Call the raw tool function directly. The tools use blocking HTTP, so they
+                # run on a worker thread to keep the event loop free for other requests.
+                structured_data = await asyncio.to_thread(_tool_function(tool_to_use), tool_input)
 
-                print(f"Direct tool call result: {structured_data}")
+                logger.debug("Direct tool call result: %s", structured_data)
 
                 # --- Generate NL Response (using structured data) ---
-                if structured_data and 'error' not in structured_data:
+                templated_response = _format_small_result(tool_to_use, structured_data) if structured_data and not _is_error(structured_data) else None
+                if templated_response:
+                    # Small fixed-shape results don't need an LLM round trip to be summarized
+                    nl_response = templated_response
+                    logger.debug("Generated templated NL response: %s", nl_response)
+                elif structured_data and not _is_error(structured_data):
                     # Use the appropriate specialist agent to summarize the data
-                    # Select the correct agent for summarization
-                    if tool_to_use == "weather":
-                        agent_to_summarize = weather_agent
-                    elif tool_to_use == "stock":
-                        agent_to_summarize = stock_agent
-                    elif tool_to_use == "historical_stock":
-                        agent_to_summarize = historical_stock_agent
-                    else: # Should not happen
-                         agent_to_summarize = orchestrator_agent # Fallback
-
-                    # Create context for the summarizer agent
-                    summary_prompt = f"User asked: '{query}'. You retrieved the following data: {structured_data}. Please summarize this data concisely for the user."
-                    # For historical data, add a note about potential truncation if data is large
-                    if tool_to_use == "historical_stock" and isinstance(structured_data.get('historical'), list) and len(structured_data['historical']) > 10:
-                         summary_prompt += " Note: If there are many data points, summarize key trends or provide the first few and last few data points, rather than listing everything."
-
-                    print(f"Running {agent_to_summarize.name} to generate NL response...")
-                    summary_result = await Runner.run(agent_to_summarize, summary_prompt) # Pass data as context
+                    agent_to_summarize = _summarizer_agent(tool_to_use)
+
+                    # Create context for the summarizer agent. The summarizing instructions are static
+                    # on the agent; the volatile query and data go into a single trailing message with a
+                    # deterministic serialization so the prompt prefix stays cacheable across turns.
+                    summary_input = [{"role": "user", "content": json.dumps({"query": query, "data": structured_data}, sort_keys=True, default=dataclasses.asdict)}]
+
+                    logger.info("Running %s to generate NL response...", agent_to_summarize.name)
+                    summary_result = await _runner().run(agent_to_summarize, summary_input) # Pass data as context
                     if summary_result and hasattr(summary_result, 'final_output') and summary_result.final_output:
                         nl_response = str(summary_result.final_output)
-                        print(f"Generated NL response: {nl_response}")
+                        logger.debug("Generated NL response: %s", nl_response)
                     else:
-                        print("Summarizer agent failed to generate NL response.")
+                        logger.warning("Summarizer agent failed to generate NL response.")
                         nl_response = "I found the data, but had trouble summarizing it."
                         # Keep structured_data so frontend can still display it
-                elif structured_data and 'error' in structured_data:
-                    print(f"Tool returned an error: {structured_data['error']}")
-                    # Ask orchestrator to formulate a polite error message based on the tool error
-                    error_context = messages_for_orchestrator + [{"role": "assistant", "content": f"Internal Note: The {tool_to_use} tool failed with error: {structured_data['error']}. Inform user politely."}]
-                    error_response_run = await Runner.run(orchestrator_agent, error_context)
-                    nl_response = str(error_response_run.final_output) if error_response_run and hasattr(error_response_run, 'final_output') else f"Sorry, I couldn't get the {tool_to_use} data due to an error."
+                elif _is_error(structured_data):
+                    logger.warning("Tool %r returned an error: %s", tool_to_use, structured_data['error'])
+                    # Tool errors are already user-readable, so phrase them locally instead of asking the orchestrator
+                    nl_response = f"Sorry, I couldn't get the {_TOOL_LABELS[tool_to_use]}. {structured_data['error']}"
                     structured_data = None # Don't send error dict to frontend
                 else:
                      # Should not happen if tool returns dict, but handle anyway
-                     print("Tool call returned unexpected result.")
+                     logger.warning("Tool call returned unexpected result.")
                      nl_response = f"Sorry, the {tool_to_use} tool returned an unexpected result."
                      structured_data = None
 
             except Exception as e:
-                print(f"Error during direct tool call or NL generation: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error during direct tool call or NL generation: %s", e)
                 nl_response = f"Sorry, an internal error occurred while processing the {tool_to_use} request."
                 structured_data = None
-        elif not tool_to_use:
-             # If heuristic triggered but no specific tool/params identified
-             print("Task query detected, but specific tool/parameters not identified. Asking orchestrator.")
-             # Fallback to general orchestrator response
+        else:
+             # Heuristic triggered but no tool parameters were identified (the keyword may have been
+             # a false positive, e.g. "Where are you from?"), so let the orchestrator answer. No tool
+             # ran on this path, so this is still the request's only LLM call.
+             logger.info("Task query detected, but specific tool/parameters not identified. Asking orchestrator.")
              try:
-                 orchestrator_response = await Runner.run(orchestrator_agent, messages_for_orchestrator)
+                 orchestrator_response = await _runner().run(orchestrator_agent, list(history))
                  if orchestrator_response and hasattr(orchestrator_response, 'final_output') and orchestrator_response.final_output:
                      nl_response = str(orchestrator_response.final_output)
-                 else:
-                     nl_response = "I understand you're asking about something specific, but I need more details."
+                 # Otherwise keep the clarifying question the heuristic wrote above
              except Exception as e:
-                 print(f"Error during fallback orchestrator call: {e}")
-                 nl_response = "Sorry, I had trouble understanding that request."
+                 logger.exception("Error during fallback orchestrator call: %s", e)
              structured_data = None
 
-
         return nl_response, structured_data
     else:
         # Query doesn't seem like a task, let the orchestrator handle conversationally
-        print("Orchestrator decided to respond directly (not a task).")
+        logger.debug("Orchestrator decided to respond directly (not a task).")
+        canned_response = _is_trivial_chitchat(lower_query)
+        if canned_response:
+            logger.debug("Answered with canned chit-chat reply.")
+            return canned_response, None
+        # The Agents SDK expects a list of input items; history already includes the current query.
+        # Only copied here, so task queries don't pay for it.
+        messages_for_orchestrator = list(history)
         try:
             # Run orchestrator agent with history to get conversational response
             # Pass the list of message dicts as the second positional argument
-            orchestrator_response = await Runner.run(orchestrator_agent, messages_for_orchestrator)
+            orchestrator_response = await _runner().run(orchestrator_agent, messages_for_orchestrator)
             if orchestrator_response and hasattr(orchestrator_response, 'final_output') and orchestrator_response.final_output:
-                 print(f"Orchestrator direct response: {orchestrator_response.final_output}")
+                 logger.debug("Orchestrator direct response: %s", orchestrator_response.final_output)
                  return str(orchestrator_response.final_output), None # Return NL response, no structured data
             else:
-                 print("Orchestrator did not provide a direct response.")
+                 logger.warning("Orchestrator did not provide a direct response.")
                  return "I'm not sure how to respond to that right now.", None # Return NL response, no structured data
         except Exception as e:
-            error_msg = f"An error occurred during Orchestrator direct response: {e}"
-            print(error_msg)
+            logger.exception("An error occurred during Orchestrator direct response: %s", e)
             return f"Sorry, an internal error occurred while formulating a response: {e}", None # Return NL response, no structured data
\ No newline at end of file
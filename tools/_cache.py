@@ -0,0 +1,161 @@
+# In-process response caches shared by the tools.
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Background refreshes of stale entries (stale-while-revalidate), shared by all caches
+_REFRESH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+def is_error(result: Any) -> bool:
+    """True for a tool's {"error": ...} result."""
+    return isinstance(result, dict) and "error" in result
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while `fn` runs for a key, other callers with the same key
+    wait for its result (or exception) instead of issuing a duplicate upstream request.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+class ResultCache:
+    """
+    Thread-safe TTL cache for successful tool results (dictionaries or result dataclasses).
+    Error dictionaries are never stored, so a failed lookup is retried on the next call.
+
+    With `stale_ttl`, an entry older than `ttl` is still served for up to `stale_ttl` more seconds
+    while a background refresh replaces it (stale-while-revalidate). If the refresh fails the stale
+    value keeps being served until it runs out, so a briefly failing API doesn't surface as errors.
+
+    With `getsizeof`, `maxsize` bounds the sum of getsizeof(value) over all entries instead of the
+    entry count; a single value larger than `maxsize` is not cached.
+    """
+    def __init__(
+        self, name: str, maxsize: int, ttl: float, stale_ttl: float = 0,
+        getsizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self._getsizeof = getsizeof
+        # Entries are (value, fresh_until) and are dropped once stale_until = fresh_until + stale_ttl passes
+        self._cache: TTLCache = TTLCache(
+            maxsize=maxsize, ttl=ttl + stale_ttl,
+            getsizeof=(lambda entry: getsizeof(entry[0])) if getsizeof else None,
+        )
+        self._lock = threading.Lock()
+        self._refreshing: Set[Hashable] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, refresh: Optional[Callable[[], Any]] = None) -> Optional[Any]:
+        """
+        Returns the cached value for `key`, or None. A stale value is only returned when `refresh`
+        is given, in which case `refresh()` is scheduled to replace it.
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                value, outcome = None, "miss"
+            elif time.monotonic() < entry[1]:
+                value, outcome = entry[0], "hit"
+            elif refresh is not None:
+                value, outcome = entry[0], "stale hit"
+                if key not in self._refreshing:
+                    # Single-flight: one background refresh per key at a time
+                    self._refreshing.add(key)
+                    _REFRESH_POOL.submit(self._refresh, key, refresh)
+            else:
+                value, outcome = None, "miss"
+            if outcome == "hit":
+                self.hits += 1
+            elif outcome == "stale hit":
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        logger.debug("%s cache %s for %r", self.name, outcome, key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if is_error(value):
+            return
+        self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if self._getsizeof is not None and self._getsizeof(value) > self._cache.maxsize:
+            # TTLCache would raise ValueError; the value is simply returned uncached
+            logger.debug("%s cache: value for %r too large to cache", self.name, key)
+            return
+        with self._lock:
+            self._cache[key] = (value, time.monotonic() + self.ttl)
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Any]) -> None:
+        try:
+            self.put(key, fetch())
+        except Exception:
+            logger.exception("%s cache: background refresh failed for %r", self.name, key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Any], negative: Optional["ErrorCache"] = None
+    ) -> Any:
+        """
+        Returns the cached result for `key`, or calls `fetch()` and caches its result if it isn't an error.
+        On a miss, a recent error for `key` in `negative` is returned instead of fetching again.
+        """
+        value = self.get(key, refresh=fetch)
+        if value is not None:
+            return value
+        if negative is not None:
+            value = negative.get(key)
+            if value is not None:
+                return value
+        value = fetch()
+        self.put(key, value)
+        return value
+
+    def cache_info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name, "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "size": self._cache.currsize, "maxsize": self._cache.maxsize,
+            }
+
+class ErrorCache(ResultCache):
+    """
+    Short-TTL cache for errors that a retry won't fix (unknown symbol, location not found), so a
+    burst of identical bad lookups is answered without hitting the API. The tools only put errors
+    here for those cases; transient failures (5xx, network) are never stored.
+    """
+    def put(self, key: Hashable, value: Any) -> None:
+        self._store(key, value)
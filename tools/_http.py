@@ -0,0 +1,119 @@
+# HTTP connection pool and settings shared by the tools.
+import functools
+import logging
+import re
+import threading
+from typing import Any, Dict, Optional
+
+import urllib3
+from urllib3.exceptions import HTTPError, MaxRetryError, NewConnectionError, TimeoutError as _URLLib3Timeout
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+class _RedactKeysFilter(logging.Filter):
+    """Masks API keys passed as query parameters in urllib3's log lines (e.g. its retry warnings)."""
+    _KEY_RE = re.compile(r"((?:apikey|appid)=)[^&\s'\"]+")
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.getMessage()
+        redacted = self._KEY_RE.sub(r"\1***", message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        return True
+
+for _name in ("urllib3.connectionpool", "urllib3.util.retry"):
+    logging.getLogger(_name).addFilter(_RedactKeysFilter())
+
+# (connect, read) timeouts for every upstream call: a stalled handshake or a slow API fails fast
+# instead of holding a worker thread and a pool slot. Read timeouts are not retried (see get_pool),
+# so a stalled upstream costs one READ_TIMEOUT (10s). Connect failures and 502/503/504 are retried
+# twice with a short backoff (Retry-After is ignored), so the absolute worst case, three slow 5xx
+# answers, is 3 x (CONNECT_TIMEOUT + READ_TIMEOUT) + ~0.6s backoff (~40s).
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10.0
+
+# Upstream hosts whose connections are opened ahead of the first request (see prewarm_connections)
+_PREWARM_URLS = (
+    "https://financialmodelingprep.com/api/v3/",
+    "https://api.openweathermap.org/data/2.5/",
+)
+
+# Returned as {"error": UPSTREAM_TIMEOUT} so callers can tell a retryable timeout from a hard failure
+UPSTREAM_TIMEOUT = "Upstream timeout, please retry."
+
+def prewarm_connections() -> None:
+    """
+    Sends a HEAD request to each upstream host on a daemon thread, so DNS resolution and the TLS
+    handshake are done before the first user query and the pool already holds a warm connection
+    per host. Best effort: failures are only logged at DEBUG.
+    """
+    def _prewarm() -> None:
+        pool = get_pool()
+        for url in _PREWARM_URLS:
+            try:
+                pool.request("HEAD", url, timeout=3.0, retries=False)
+            except Exception as e:
+                logger.debug("Prewarming %s failed: %s", url, e)
+
+    threading.Thread(target=_prewarm, name="http-prewarm", daemon=True).start()
+
+def require_key(env_name: str, value: Optional[str], label: str) -> Optional[Dict[str, str]]:
+    """
+    Checks an API key read at import time. Returns None when it is set; otherwise logs the problem
+    once and returns the error result the tool gives back on every call.
+    """
+    if value:
+        return None
+    logger.error("%s not set in environment.", env_name)
+    return {"error": f"Server configuration error: {label} API key not set."}
+
+class UpstreamError(Exception):
+    """The request never produced an HTTP response (DNS, connection refused, TLS, ...)."""
+
+class UpstreamTimeout(UpstreamError):
+    """Connect or read timeout, after retries."""
+
+@functools.lru_cache(maxsize=None)
+def get_pool() -> urllib3.PoolManager:
+    """
+    Returns the process-wide urllib3 pool used by every tool. Sharing one pool means a conversation
+    that moves between the stock and weather tools keeps reusing warm keep-alive connections
+    (and TLS sessions) instead of each module paying for its own handshakes. urllib3 is used
+    directly: the JSON bodies are small and read in one go, so requests' Response layer only adds
+    overhead.
+    """
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=32,
+        headers={"Accept": "application/json"},
+        timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+        # read=0: a read timeout fails immediately instead of waiting READ_TIMEOUT again; only connect
+        # errors and 502/503/504 are retried. respect_retry_after_header=False: a 503's Retry-After
+        # (urllib3 honours up to 6 hours by default) would otherwise hold the worker thread that long.
+        # raise_on_status=False: once retries run out, the last 5xx response is returned like any other.
+        retries=Retry(
+            total=2, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+            respect_retry_after_header=False, raise_on_status=False,
+        ),
+    )
+
+def http_get(url: str, params: Dict[str, Any]) -> urllib3.BaseHTTPResponse:
+    """
+    GETs `url` with `params` as the query string and returns the response, whatever its status
+    (callers branch on `response.status` and decode `response.data`). Transport failures raise
+    UpstreamTimeout or UpstreamError instead of urllib3's exceptions.
+    """
+    try:
+        return get_pool().request("GET", url, fields=params)
+    except MaxRetryError as e:
+        # Retries exhausted: report the underlying failure
+        reason = e.reason
+        # NewConnectionError subclasses ConnectTimeoutError but is not a timeout
+        if isinstance(reason, _URLLib3Timeout) and not isinstance(reason, NewConnectionError):
+            raise UpstreamTimeout(str(reason)) from e
+        raise UpstreamError(str(reason)) from e
+    except _URLLib3Timeout as e:
+        raise UpstreamTimeout(str(e)) from e
+    except HTTPError as e:
+        raise UpstreamError(str(e)) from e
@@ -1,11 +1,42 @@
 import os
-import requests
-from typing_extensions import TypedDict
-from typing import Optional, List, Dict, Any
+import sys
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+if sys.version_info >= (3, 12):
+    from typing import TypedDict
+else:
+    from typing_extensions import TypedDict # Pydantic (tool schemas) rejects typing.TypedDict before 3.12
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import date
 
 # Environment variables loaded by api.py
 from agents import function_tool
+from ._cache import ResultCache, SingleFlight
+from ._http import UPSTREAM_TIMEOUT, UpstreamError, UpstreamTimeout, http_get, require_key
+
+logger = logging.getLogger(__name__)
+
+# Read and checked once at import (see stock.py)
+_FMP_API_KEY = os.environ.get("FMP_API_KEY")
+_KEY_ERROR = require_key("FMP_API_KEY", _FMP_API_KEY, "Stock")
+
+# Successful responses keyed by (SYMBOL, start_date, end_date). EOD bars don't change once the
+# trading day has closed, so entries can live for a while (and past that, be served stale while
+# they are refreshed in the background). Bounded by total bar count rather than entries: a multi-year
+# range is thousands of bars (several MB), so 1024 such entries would hold over a gigabyte.
+_HISTORY_CACHE = ResultCache(
+    "historical stock", maxsize=100_000, ttl=600, stale_ttl=3600,
+    getsizeof=lambda result: max(1, len(result.get("historical") or ())),
+)
+
+# Requests currently on the wire, keyed like the cache: concurrent identical calls share one request
+_INFLIGHT = SingleFlight()
+
+# Upper bound on parallel upstream requests made by fetch_historical_stock_many
+_MAX_PARALLEL_FETCHES = 8
 
 # Input schema
 class HistoricalStockInput(TypedDict):
@@ -20,13 +51,13 @@ def _fetch_historical_stock_func(data: HistoricalStockInput) -> Dict[str, Any]:
     using the Financial Modeling Prep API. Returns a dictionary containing a list of
     historical data points or an error dictionary.
     """
-    api_key = os.getenv("FMP_API_KEY")
-    if not api_key:
-        return {"error": "Server configuration error: Stock API key not set."}
+    if _KEY_ERROR:
+        return _KEY_ERROR
 
     symbol = data.get("symbol")
     start_date_str = data.get("start_date")
-    end_date_str = data.get("end_date", date.today().isoformat()) # Default end date to today
+    today_str = date.today().isoformat()
+    end_date_str = data.get("end_date") or today_str # Default end date to today
 
     if not symbol:
         return {"error": "Please provide a stock ticker symbol."}
@@ -40,19 +71,41 @@ def _fetch_historical_stock_func(data: HistoricalStockInput) -> Dict[str, Any]:
     except ValueError:
         return {"error": "Invalid date format. Please use YYYY-MM-DD."}
 
-    base_url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{symbol.upper()}"
+    symbol = symbol.upper()
+    cache_key = (symbol, start_date_str, end_date_str)
+    # A range ending today can still change intraday, so it's always fetched fresh
+    if end_date_str == today_str:
+        return _coalesced_request(cache_key)
+    return _HISTORY_CACHE.get_or_fetch(cache_key, lambda: _coalesced_request(cache_key))
+
+def _coalesced_request(key: Tuple[str, str, str]) -> Dict[str, Any]:
+    """(Internal) Runs the upstream request for `key`, or waits for an identical one already in flight."""
+    return _INFLIGHT.do(key, lambda: _request_historical_data(*key))
+
+def _request_historical_data(symbol: str, start_date_str: str, end_date_str: str) -> Dict[str, Any]:
+    """(Internal) Performs the FMP request for an already validated symbol and date range."""
+    base_url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{symbol}"
     params = {
-        "apikey": api_key,
+        "apikey": _FMP_API_KEY,
         "from": start_date_str,
         "to": end_date_str
     }
 
-    print(f"Fetching historical data: URL={base_url}, Params={params}")
+    logger.debug("Fetching historical data: symbol=%s, from=%s, to=%s", symbol, start_date_str, end_date_str)
 
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        res = response.json()
+        # Shared pool, so repeated calls reuse keep-alive connections (no new TCP/TLS handshake per call)
+        response = http_get(base_url, params)
+        if response.status >= 400:
+            logger.warning("HTTP error occurred: %s %s - Response: %s", response.status, response.reason, response.data)
+            if response.status == 401:
+                 return {"error": "Server configuration error: Invalid Stock API key."}
+            elif response.status == 404: # May indicate invalid symbol or no data for range
+                 return {"error": f"Historical data for symbol '{symbol}' not found or unavailable for the specified date range."}
+            else:
+                return {"error": f"Failed to fetch historical stock data due to HTTP error: {response.status} {response.reason}"}
+
+        res = orjson.loads(response.data)
 
         # The API response structure might contain a 'historical' key
         if isinstance(res, dict) and 'historical' in res and isinstance(res['historical'], list):
@@ -68,31 +121,43 @@ def _fetch_historical_stock_func(data: HistoricalStockInput) -> Dict[str, Any]:
                     "volume": item.get("volume")
                 } for item in historical_data
             ]
-            # Sort by date ascending (API might already do this)
-            formatted_data.sort(key=lambda x: x.get("date", ""))
-            print(f"Successfully fetched {len(formatted_data)} historical records.")
+            # FMP returns bars newest first: flip to ascending with an O(n) reverse rather than a keyed
+            # sort, and leave the list alone if it's already ascending
+            if formatted_data and formatted_data[0]["date"] > formatted_data[-1]["date"]:
+                formatted_data.reverse()
+            logger.debug("Successfully fetched %d historical records.", len(formatted_data))
             return {"symbol": symbol, "historical": formatted_data}
         elif isinstance(res, dict) and res.get("Error Message"):
              return {"error": f"Could not fetch historical data for symbol '{symbol}'. API Error: {res.get('Error Message')}"}
         else:
-            print(f"Unexpected response format for historical data: {res}")
+            logger.warning("Unexpected response format for historical data: %s", res)
             return {"error": f"Could not fetch historical data for symbol '{symbol}'. Unexpected API response format."}
 
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err} - Response: {response.text}")
-        if response.status_code == 401:
-             return {"error": "Server configuration error: Invalid Stock API key."}
-        elif response.status_code == 404: # May indicate invalid symbol or no data for range
-             return {"error": f"Historical data for symbol '{symbol}' not found or unavailable for the specified date range."}
-        else:
-            return {"error": f"Failed to fetch historical stock data due to HTTP error: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
+    except UpstreamTimeout:
+        return {"error": UPSTREAM_TIMEOUT}
+    except UpstreamError as req_err:
         return {"error": f"Network error connecting to Stock API: {req_err}"}
     except Exception as e:
         return {"error": f"An unexpected error occurred: {e}"}
 
+@functools.wraps(_fetch_historical_stock_func)
+async def _fetch_historical_stock_async(data: HistoricalStockInput) -> Dict[str, Any]:
+    # See _fetch_stock_price_async in stock.py
+    return await asyncio.to_thread(_fetch_historical_stock_func, data)
+
 # Create the FunctionTool object for the agent runner
-fetch_historical_stock_tool = function_tool(_fetch_historical_stock_func)
+fetch_historical_stock_tool = function_tool(_fetch_historical_stock_async)
+
+def _fetch_historical_stock_many(items: List[HistoricalStockInput]) -> List[Dict[str, Any]]:
+    """
+    (Internal) Fetches historical data for several symbols/date ranges concurrently over the shared
+    connection pool. Results are returned in the same order as `items`.
+    """
+    if len(items) <= 1:
+        return [_fetch_historical_stock_func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(len(items), _MAX_PARALLEL_FETCHES)) as pool:
+        return list(pool.map(_fetch_historical_stock_func, items))
 
-# Expose the raw function for direct calls
-fetch_historical_stock = _fetch_historical_stock_func
\ No newline at end of file
+# Expose the raw functions for direct calls
+fetch_historical_stock = _fetch_historical_stock_func
+fetch_historical_stock_many = _fetch_historical_stock_many
\ No newline at end of file
@@ -1,77 +1,187 @@
 import os
-import requests
-from typing_extensions import TypedDict
-from typing import Optional
+import sys
+import asyncio
+import functools
+from dataclasses import dataclass
+import orjson
+if sys.version_info >= (3, 12):
+    from typing import TypedDict
+else:
+    from typing_extensions import TypedDict # Pydantic (tool schemas) rejects typing.TypedDict before 3.12
+from typing import Dict, List, Optional, Union
 from datetime import datetime # Import datetime for timestamp
 # Removed: from dotenv import load_dotenv
 # Environment variables should be loaded by the main application entry point (e.g., api.py)
 
 from agents import function_tool
+from ._cache import ErrorCache, ResultCache, SingleFlight
+from ._http import UPSTREAM_TIMEOUT, UpstreamError, UpstreamTimeout, http_get, require_key
 
-# Input schema for the stock tool
+# Read and checked once at import (api.py loads .env before the tools are imported), so calls
+# don't touch the environment
+_FMP_API_KEY = os.environ.get("FMP_API_KEY")
+_KEY_ERROR = require_key("FMP_API_KEY", _FMP_API_KEY, "Stock")
+# Use the /quote endpoint instead of /quote-short
+_QUOTE_URL = "https://financialmodelingprep.com/api/v3/quote/{}"
+
+# Quotes move quickly: a short TTL trades a few seconds of staleness for skipping the round trip.
+# For another minute a stale quote is still answered immediately while it is refreshed in the background.
+_QUOTE_CACHE = ResultCache("stock quote", maxsize=1024, ttl=30, stale_ttl=60)
+# Unknown symbols, remembered briefly so repeated bad lookups don't each cost a round trip
+_NEG_CACHE = ErrorCache("stock quote (not found)", maxsize=512, ttl=60)
+# Quote requests on the wire, keyed by their symbol tuple: concurrent identical lookups share one request
+_INFLIGHT = SingleFlight()
+
+# Input schemas for the stock tools
 class StockInput(TypedDict):
     symbol: str # The stock ticker symbol (e.g., AAPL, GOOGL)
 
-# Define the raw function first
-def _fetch_stock_price_func(data: StockInput) -> dict:
+class BatchStockInput(TypedDict):
+    symbols: List[str] # Several ticker symbols (e.g., ["AAPL", "MSFT"])
+
+# Successful quote result (errors are still returned as {"error": ...} dictionaries).
+# Slotted (no per-instance __dict__) and frozen: cached quotes are shared between callers.
+@dataclass(slots=True, frozen=True)
+class StockQuote:
+    symbol: str
+    latest_price: Optional[float]
+    high: Optional[float]
+    low: Optional[float]
+    volume: Optional[int]
+    timestamp: str # ISO 8601
+
+# Tickers are a small, heavily repeated set: memoizing the normalization reuses one string per ticker
+@functools.lru_cache(maxsize=1024)
+def _norm_symbol(symbol: Optional[str]) -> str:
+    return (symbol or "").strip().upper()
+
+# Define the raw functions first
+def _fetch_stock_price_func(data: StockInput) -> Union[StockQuote, dict]:
     """
     (Internal) Fetch detailed stock quote (price, high, low, volume) for a given ticker symbol using the Financial Modeling Prep API.
-    Returns a dictionary containing stock data on success, or an error dictionary on failure.
+    Returns a StockQuote on success, or an error dictionary on failure.
     """
-    # Ensure the correct environment variable name is used (as seen in previous logs)
-    api_key = os.getenv("FMP_API_KEY")
-    if not api_key:
-        # print("Error: FMP_API_KEY not set in environment.") # Removed print
-        return {"error": "Server configuration error: Stock API key not set."}
+    if _KEY_ERROR:
+        return _KEY_ERROR
 
-    symbol = data.get("symbol")
+    symbol = _norm_symbol(data.get("symbol"))
     if not symbol:
         return {"error": "Please provide a stock ticker symbol."}
 
-    # Use the /quote endpoint instead of /quote-short
-    base_url = f"https://financialmodelingprep.com/api/v3/quote/{symbol.upper()}"
-    params = {"apikey": api_key}
+    return _cached_quotes([symbol])[symbol]
+
+def _fetch_stock_prices_batch(data: BatchStockInput) -> dict:
+    """
+    (Internal) Fetch detailed stock quotes (price, high, low, volume) for several ticker symbols in one
+    Financial Modeling Prep API request. Returns {"quotes": {SYMBOL: StockQuote or error dictionary}},
+    or an error dictionary if the request can't be made at all.
+    """
+    if _KEY_ERROR:
+        return _KEY_ERROR
+
+    # Normalize and de-duplicate, keeping the caller's order
+    symbols = list(dict.fromkeys(filter(None, map(_norm_symbol, data.get("symbols") or ()))))
+    if not symbols:
+        return {"error": "Please provide at least one stock ticker symbol."}
+
+    return {"quotes": _cached_quotes(symbols)}
+
+def _cached_quotes(symbols: List[str]) -> Dict[str, Union[StockQuote, dict]]:
+    """(Internal) Serves normalized symbols from the caches and fetches the rest in a single request."""
+    quotes = {}
+    missing = []
+    for symbol in symbols:
+        cached = _QUOTE_CACHE.get(symbol, refresh=functools.partial(_request_quote, symbol)) or _NEG_CACHE.get(symbol)
+        if cached is None:
+            missing.append(symbol)
+        else:
+            quotes[symbol] = cached
+    if missing:
+        for symbol, quote in _INFLIGHT.do(tuple(missing), lambda: _request_stock_prices(missing)).items():
+            _QUOTE_CACHE.put(symbol, quote) # Errors aren't stored
+            quotes[symbol] = quote
+    return {symbol: quotes[symbol] for symbol in symbols}
+
+def _request_quote(symbol: str) -> Union[StockQuote, dict]:
+    # Single-symbol request, used to refresh a stale cache entry
+    return _INFLIGHT.do((symbol,), lambda: _request_stock_prices([symbol]))[symbol]
+
+def _request_stock_prices(symbols: List[str]) -> Dict[str, Union[StockQuote, dict]]:
+    """(Internal) Performs one FMP quote request for already validated symbols; returns a result per symbol."""
+    # The /quote endpoint takes a comma-separated symbol list
+    base_url = _QUOTE_URL.format(",".join(symbols))
+    params = {"apikey": _FMP_API_KEY}
+    joined = ", ".join(symbols)
 
     try:
-        response = requests.get(base_url, params=params) # Pass params to requests.get
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        res = response.json()
+        response = http_get(base_url, params) # Pooled keep-alive connection, (connect, read) timeouts
+        if response.status == 401:
+            return {symbol: {"error": "Server configuration error: Invalid Stock API key."} for symbol in symbols}
+        elif response.status == 404:
+            return {symbol: _not_found(symbol, {"error": f"Stock symbol '{symbol}' not found."}) for symbol in symbols}
+        elif response.status >= 400:
+            error = {"error": f"Failed to fetch stock data due to HTTP error: {response.status} {response.reason}"}
+            return {symbol: error for symbol in symbols}
 
-        if isinstance(res, list) and len(res) > 0:
-            stock_data = res[0]
+        res = orjson.loads(response.data)
+        if isinstance(res, list):
+            timestamp = datetime.now().isoformat() # Add current timestamp
             # Extract the required fields
+            found = {}
+            for stock_data in res:
+                symbol = stock_data.get("symbol")
+                found[symbol] = StockQuote(
+                    symbol=symbol,
+                    latest_price=stock_data.get("price"), # Map 'price' to 'latest_price'
+                    high=stock_data.get("dayHigh"),       # Map 'dayHigh' to 'high'
+                    low=stock_data.get("dayLow"),         # Map 'dayLow' to 'low'
+                    volume=stock_data.get("volume"),
+                    timestamp=timestamp,
+                )
+            # FMP leaves unknown symbols out of the list (an empty list if none is known)
             return {
-                "symbol": stock_data.get("symbol"),
-                "latest_price": stock_data.get("price"), # Map 'price' to 'latest_price'
-                "high": stock_data.get("dayHigh"),      # Map 'dayHigh' to 'high'
-                "low": stock_data.get("dayLow"),        # Map 'dayLow' to 'low'
-                "volume": stock_data.get("volume"),
-                "timestamp": datetime.now().isoformat() # Add current timestamp
+                symbol: found.get(symbol) or _not_found(symbol, {"error": f"Stock symbol '{symbol}' not found."})
+                for symbol in symbols
             }
         elif isinstance(res, dict) and res.get("Error Message"):
              # print(f"Error from FMP API for {symbol}: {res.get('Error Message')}") # Removed print
-             return {"error": f"Could not fetch data for symbol '{symbol}'. It might be invalid. {res.get('Error Message')}"}
+             return {
+                 symbol: _not_found(symbol, {"error": f"Could not fetch data for symbol '{symbol}'. It might be invalid. {res.get('Error Message')}"})
+                 for symbol in symbols
+             }
         else:
             # print(f"Unexpected response format from FMP API for {symbol}: {res}") # Removed print
-            return {"error": f"Could not fetch data for symbol '{symbol}'. Unexpected API response format."}
-
-    except requests.exceptions.HTTPError as http_err:
-        # print(f"HTTP error occurred: {http_err} - Response: {response.text}") # Removed print
-        if response.status_code == 401:
-             return {"error": "Server configuration error: Invalid Stock API key."}
-        elif response.status_code == 404:
-             return {"error": f"Stock symbol '{symbol}' not found."}
-        else:
-            return {"error": f"Failed to fetch stock data due to HTTP error: {http_err}"}
-    except requests.exceptions.RequestException as req_err:
+            error = {"error": f"Could not fetch data for symbol '{joined}'. Unexpected API response format."}
+
+    except UpstreamTimeout:
+        error = {"error": UPSTREAM_TIMEOUT}
+    except UpstreamError as req_err:
         # print(f"Request error occurred: {req_err}") # Removed print
-        return {"error": f"Network error connecting to Stock API: {req_err}"}
+        error = {"error": f"Network error connecting to Stock API: {req_err}"}
     except Exception as e:
         # print(f"An unexpected error occurred in fetch_stock_price: {e}") # Removed print
-        return {"error": f"An unexpected error occurred: {e}"}
+        error = {"error": f"An unexpected error occurred: {e}"}
+    return {symbol: error for symbol in symbols}
+
+def _not_found(symbol: str, error: dict) -> dict:
+    # Only "symbol doesn't exist" answers are negative-cached; 5xx and network errors are transient
+    _NEG_CACHE.put(symbol, error)
+    return error
+
+@functools.wraps(_fetch_stock_price_func)
+async def _fetch_stock_price_async(data: StockInput) -> Union[StockQuote, dict]:
+    # The agent runner awaits async tools: running the blocking HTTP call on a worker thread keeps
+    # the event loop free, so concurrent tool calls (e.g. weather + stock) overlap.
+    return await asyncio.to_thread(_fetch_stock_price_func, data)
+
+@functools.wraps(_fetch_stock_prices_batch)
+async def _fetch_stock_prices_batch_async(data: BatchStockInput) -> dict:
+    return await asyncio.to_thread(_fetch_stock_prices_batch, data)
 
-# Create the FunctionTool object for the agent runner
-fetch_stock_price_tool = function_tool(_fetch_stock_price_func)
+# Create the FunctionTool objects for the agent runner (same name, docstring and schema as the raw functions)
+fetch_stock_price_tool = function_tool(_fetch_stock_price_async)
+fetch_stock_prices_batch_tool = function_tool(_fetch_stock_prices_batch_async)
 
-# Expose the raw function for direct calls
-fetch_stock_price = _fetch_stock_price_func
\ No newline at end of file
+# Expose the raw functions for direct calls
+fetch_stock_price = _fetch_stock_price_func
+fetch_stock_prices = _fetch_stock_prices_batch
\ No newline at end of file
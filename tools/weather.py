@@ -1,78 +1,159 @@
 import os
-import requests
-from datetime import datetime, timezone
-from typing_extensions import TypedDict
-from typing import Optional
+import sys
+import asyncio
+import functools
+from dataclasses import dataclass
+import logging
+import orjson
+import time
+if sys.version_info >= (3, 12):
+    from typing import TypedDict
+else:
+    from typing_extensions import TypedDict # Pydantic (tool schemas) rejects typing.TypedDict before 3.12
+from typing import Optional, Union
 # Removed: from dotenv import load_dotenv
 # Environment variables should be loaded by the main application entry point (e.g., api.py)
 
 from agents import function_tool
+from ._cache import ErrorCache, ResultCache, SingleFlight
+from ._http import UPSTREAM_TIMEOUT, UpstreamError, UpstreamTimeout, http_get, require_key
+
+logger = logging.getLogger(__name__)
+
+# Read and checked once at import (see stock.py)
+_OWM_API_KEY = os.environ.get("OPEN_WEATHER_API_KEY")
+_KEY_ERROR = require_key("OPEN_WEATHER_API_KEY", _OWM_API_KEY, "Weather")
+_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+# Current conditions change slowly enough that a few minutes of reuse is fine, and a stale
+# answer is served for up to 10 more minutes while it is refreshed in the background
+_WEATHER_CACHE = ResultCache("weather", maxsize=1024, ttl=300, stale_ttl=600)
+# Unknown locations, remembered briefly (see _NEG_CACHE in stock.py)
+_NEG_CACHE = ErrorCache("weather (not found)", maxsize=512, ttl=60)
+# Requests on the wire, keyed like the cache (see stock.py)
+_INFLIGHT = SingleFlight()
+
+# Values accepted by OpenWeather's `units` parameter
+_UNITS = frozenset({"metric", "imperial", "standard"})
 
 # Input schema for the weather tool
 class WeatherInput(TypedDict):
     location: str
     lat: Optional[float]
     lon: Optional[float]
-    unit: str  # 'metric' or 'imperial'
+    unit: str  # 'metric', 'imperial' or 'standard' (Kelvin)
+
+# Successful weather result (errors are still returned as {"error": ...} dictionaries), slotted and frozen like StockQuote
+@dataclass(slots=True, frozen=True)
+class WeatherResult:
+    location: str
+    temperature: Optional[float]
+    feels_like: Optional[float]
+    humidity: Optional[int]
+    pressure: Optional[int]
+    weather: Optional[str]
+    wind_speed: Optional[float]
+    visibility: Union[int, str] # Metres, or "N/A"
+    sunrise: Optional[str] # ISO 8601, UTC
+    sunset: Optional[str]
+
+# Locations and units repeat a lot, so their normalization is memoized
+@functools.lru_cache(maxsize=1024)
+def _norm_location(location: Optional[str]) -> str:
+    return (location or "").strip().lower()
+
+@functools.lru_cache(maxsize=16)
+def _norm_unit(unit: Optional[str]) -> Optional[str]:
+    """Returns the lower-cased unit (metric by default), or None if OpenWeather doesn't support it."""
+    unit = (unit or "metric").strip().lower()
+    return unit if unit in _UNITS else None
 
 # Define the raw function first
-def _fetch_weather_func(data: WeatherInput) -> dict:
+def _fetch_weather_func(data: WeatherInput) -> Union[WeatherResult, dict]:
     """
     (Internal) Fetches the current weather data for a given location or coordinates using the OpenWeather API.
-    Returns a dictionary containing weather data on success, or an error dictionary on failure.
+    Returns a WeatherResult on success, or an error dictionary on failure.
     """
     # log.append("Fetching weather data...") # Removed logging for simplicity
-    api_key = os.getenv("OPEN_WEATHER_API_KEY")
-    if not api_key:
-        # Log the error instead of returning it directly in the tool's result
-        print("Error: OPEN_WEATHER_API_KEY not set in environment.")
-        return {"error": "Server configuration error: Weather API key not set."}
+    if _KEY_ERROR:
+        return _KEY_ERROR
     # log.append(f"API key found: {'*' * (len(api_key) - 4)}{api_key[-4:]}") # Removed logging
 
-    base_url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {"appid": api_key, "units": data.get("unit", "metric")}
+    # Normalize once: the same values feed the request and the cache key
+    location = _norm_location(data.get("location"))
+    unit = _norm_unit(data.get("unit"))
+    if unit is None:
+        return {"error": "Unit must be 'metric', 'imperial' or 'standard'."}
 
-    if data.get("lat") is not None and data.get("lon") is not None:
-        params.update({"lat": data["lat"], "lon": data["lon"]})
-    elif data.get("location"):
-        params.update({"q": data["location"]})
+    lat, lon = data.get("lat"), data.get("lon")
+    if lat is not None and lon is not None:
+        params = {"appid": _OWM_API_KEY, "units": unit, "lat": lat, "lon": lon}
+    elif location:
+        params = {"appid": _OWM_API_KEY, "units": unit, "q": location}
     else:
         return {"error": "Please provide either a location name or latitude/longitude coordinates."}
 
+    cache_key = (location, lat, lon, unit)
+    return _WEATHER_CACHE.get_or_fetch(
+        cache_key, lambda: _INFLIGHT.do(cache_key, lambda: _request_weather(params, cache_key)), negative=_NEG_CACHE
+    )
+
+def _epoch_to_iso(ts: Optional[float]) -> Optional[str]:
+    # Same string as datetime.fromtimestamp(ts, timezone.utc).isoformat() for OpenWeather's whole-second
+    # timestamps, without building a datetime. Partial responses may omit sunrise/sunset.
+    if ts is None:
+        return None
+    tm = time.gmtime(ts)
+    return "%04d-%02d-%02dT%02d:%02d:%02d+00:00" % (tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec)
+
+def _request_weather(params: dict, cache_key: tuple) -> Union[WeatherResult, dict]:
+    """(Internal) Performs the OpenWeather request for already built query params."""
     try:
-        response = requests.get(base_url, params=params)
-        res = response.json()
-
-        if response.status_code == 200:
-            return {
-                "location": f"{res.get('name')}, {res['sys'].get('country')}",
-                "temperature": res["main"].get("temp"),
-                "feels_like": res["main"].get("feels_like"),
-                "humidity": res["main"].get("humidity"),
-                "pressure": res["main"].get("pressure"),
-                "weather": res["weather"][0].get("description"),
-                "wind_speed": res["wind"].get("speed"),
-                "visibility": res.get("visibility", "N/A"),
-                "sunrise": datetime.fromtimestamp(res["sys"].get("sunrise"), timezone.utc).isoformat(),
-                "sunset": datetime.fromtimestamp(res["sys"].get("sunset"), timezone.utc).isoformat(),
-            }
-        elif response.status_code == 401:
-             print(f"Error: Unauthorized. Check API Key. Response: {res}")
-             return {"error": "Server configuration error: Invalid Weather API key."}
-        elif response.status_code == 404:
-            return {"error": "Location not found. Use a valid name or lat/lon."}
-        else:
-            print(f"Error: OpenWeather API request failed. Status: {response.status_code}, Response: {res}")
-            return {"error": res.get("message", "Unknown error fetching weather data.")}
-    except requests.exceptions.RequestException as e:
-        print(f"Error: Network error connecting to OpenWeather API. {e}")
+        response = http_get(_WEATHER_URL, params)
+        # Error bodies aren't parsed; the status code is enough
+        if response.status == 401:
+            logger.error("Unauthorized. Check API Key. Response: %s", response.data)
+            return {"error": "Server configuration error: Invalid Weather API key."}
+        elif response.status == 404:
+            error = {"error": "Location not found. Use a valid name or lat/lon."}
+            _NEG_CACHE.put(cache_key, error) # Not transient, unlike 5xx/network errors
+            return error
+        elif response.status >= 400:
+            logger.warning("OpenWeather API request failed. Status: %s, Response: %s", response.status, response.data)
+            return {"error": f"Failed to fetch weather data due to HTTP error: {response.status} {response.reason}"}
+
+        res = orjson.loads(response.data)
+
+        main, sys_, wind = res["main"], res["sys"], res["wind"]
+        return WeatherResult(
+            location=f"{res.get('name')}, {sys_.get('country')}",
+            temperature=main.get("temp"),
+            feels_like=main.get("feels_like"),
+            humidity=main.get("humidity"),
+            pressure=main.get("pressure"),
+            weather=res["weather"][0].get("description"),
+            wind_speed=wind.get("speed"),
+            visibility=res.get("visibility", "N/A"),
+            sunrise=_epoch_to_iso(sys_.get("sunrise")),
+            sunset=_epoch_to_iso(sys_.get("sunset")),
+        )
+    except UpstreamTimeout as e:
+        logger.warning("Timed out connecting to OpenWeather API. %s", e)
+        return {"error": UPSTREAM_TIMEOUT}
+    except UpstreamError as e:
+        logger.warning("Network error connecting to OpenWeather API. %s", e)
         return {"error": f"Network error: {e}"}
     except Exception as e:
-        print(f"Error: An unexpected error occurred in fetch_weather. {e}")
+        logger.exception("An unexpected error occurred in fetch_weather. %s", e)
         return {"error": f"An unexpected error occurred: {e}"}
 
+@functools.wraps(_fetch_weather_func)
+async def _fetch_weather_async(data: WeatherInput) -> Union[WeatherResult, dict]:
+    # Async entry point for the agent runner; the blocking request runs on a worker thread
+    return await asyncio.to_thread(_fetch_weather_func, data)
+
 # Create the FunctionTool object for the agent runner
-fetch_weather_tool = function_tool(_fetch_weather_func)
+fetch_weather_tool = function_tool(_fetch_weather_async)
 
 # Expose the raw function for direct calls if needed (optional, but useful here)
 fetch_weather = _fetch_weather_func
\ No newline at end of file